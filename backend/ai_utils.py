@@ -3,6 +3,7 @@ from bs4 import BeautifulSoup
 from transformers import RobertaTokenizer, RobertaForSequenceClassification
 import torch
 from typing import List, Optional
+from .metrics import timed, record_model_memory
 
 # Load RoBERTa model and tokenizer
 ROBERTA_MODEL_PATH = "./data/custom_roberta_model"
@@ -10,6 +11,7 @@ tokenizer = RobertaTokenizer.from_pretrained(ROBERTA_MODEL_PATH, local_files_onl
 model = RobertaForSequenceClassification.from_pretrained(
     ROBERTA_MODEL_PATH, local_files_only=True
 )
+record_model_memory("roberta", model)
 
 # Define categories
 CATEGORIES = [
@@ -25,17 +27,31 @@ CATEGORIES = [
 ]
 
 
+def parse_html(content: bytes):
+    """Parse HTML into a soup and its visible text."""
+    with timed("parse"):
+        soup = BeautifulSoup(content, "html.parser")
+        for script_or_style in soup(["script", "style"]):
+            script_or_style.decompose()
+        text = soup.get_text(separator=" ", strip=True)
+    return soup, text
+
+
+def title_from_soup(soup) -> Optional[str]:
+    """Return the stripped <title> of a parsed page, if any."""
+    return (
+        soup.title.string.strip() if soup and soup.title and soup.title.string else None
+    )
+
+
 def fetch_page_content(url: str):
     """Fetch HTML content and text from a URL."""
     try:
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-        response = requests.get(url, timeout=10, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.decompose()
-        text = soup.get_text(separator=" ", strip=True)
-        return soup, text
+        with timed("fetch"):
+            response = requests.get(url, timeout=10, headers=headers)
+            response.raise_for_status()
+        return parse_html(response.content)
     except requests.RequestException:
         return None, None
 
@@ -43,9 +59,7 @@ def fetch_page_content(url: str):
 def extract_title_from_url(url: str) -> Optional[str]:
     """Extract the webpage title from a URL."""
     soup, _ = fetch_page_content(url)
-    return (
-        soup.title.string.strip() if soup and soup.title and soup.title.string else None
-    )
+    return title_from_soup(soup)
 
 
 def suggest_tags_from_url(
@@ -56,15 +70,23 @@ def suggest_tags_from_url(
     Returns (tags, category).
     """
     _, text = fetch_page_content(url)
+    return suggest_tags_from_text(text, num_tags)
+
+
+def suggest_tags_from_text(
+    text: Optional[str], num_tags: int = 5
+) -> tuple[List[str], Optional[str]]:
+    """Classify already-extracted page text. Returns (tags, category)."""
     if not text:
         return [], None
 
     # Tokenize and predict
-    inputs = tokenizer(
-        text, return_tensors="pt", truncation=True, max_length=512, padding=True
-    )
+    with timed("tokenize"):
+        inputs = tokenizer(
+            text, return_tensors="pt", truncation=True, max_length=512, padding=True
+        )
     model.eval()
-    with torch.no_grad():
+    with timed("infer"), torch.no_grad():
         outputs = model(**inputs)
         probs = torch.sigmoid(outputs.logits).squeeze().cpu().numpy()
 
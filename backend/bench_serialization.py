@@ -0,0 +1,67 @@
+"""Benchmark bookmark serialization cost per 1k rows.
+
+Run from the repository root:
+
+    python -m backend.bench_serialization
+"""
+
+import json
+import timeit
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from .schemas import BookmarkResponse
+from .serialization import bookmarks_to_list, dumps
+
+ROWS = 1000
+REPEAT = 20
+
+
+def make_rows(n: int = ROWS):
+    """Build ORM-like bookmark rows without touching the database."""
+    now = datetime.now(timezone.utc)
+    tags = [SimpleNamespace(id=i, name=f"tag{i}") for i in range(3)]
+    return [
+        SimpleNamespace(
+            id=i,
+            url=f"https://example.com/articles/{i}",
+            title=f"Example article {i}",
+            description="A reasonably sized description of the bookmarked page.",
+            category="tech",
+            position=float(i),
+            created_at=now,
+            updated_at=now,
+            link_status=200,
+            link_checked_at=now,
+            tags=tags,
+        )
+        for i in range(n)
+    ]
+
+
+def pydantic_stdlib_json(rows):
+    """Old broadcast path: validate, dump to dict, encode with stdlib json."""
+    return json.dumps(
+        [BookmarkResponse.model_validate(r).model_dump(mode="json") for r in rows]
+    )
+
+
+def pydantic_json(rows):
+    """FastAPI response_model path: validate and serialize with Pydantic."""
+    return [BookmarkResponse.model_validate(r).model_dump_json() for r in rows]
+
+
+def fast_path(rows):
+    """Row-to-dict path encoded with orjson."""
+    return dumps(bookmarks_to_list(rows))
+
+
+def main():
+    rows = make_rows()
+    for func in (pydantic_stdlib_json, pydantic_json, fast_path):
+        best = min(timeit.repeat(lambda: func(rows), number=1, repeat=REPEAT))
+        print(f"{func.__name__:<22} {best * 1000:8.2f} ms per {ROWS} bookmarks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+from . import crud, ai_utils, dedupe
+from .database import SessionLocal
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Seconds between crawl passes
+CRAWL_INTERVAL_SECONDS = float(os.getenv("CRAWL_INTERVAL_SECONDS", "3600"))
+# Bookmarks are re-checked once their last check is older than this
+CRAWL_RECHECK_HOURS = float(os.getenv("CRAWL_RECHECK_HOURS", "168"))
+# Interactions within this window decide crawl priority
+CRAWL_ACTIVITY_DAYS = int(os.getenv("CRAWL_ACTIVITY_DAYS", "30"))
+CRAWL_BATCH_SIZE = int(os.getenv("CRAWL_BATCH_SIZE", "500"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+# Minimum seconds between two requests to the same host
+CRAWL_DOMAIN_DELAY = float(os.getenv("CRAWL_DOMAIN_DELAY", "5"))
+# Top-priority bookmarks per batch fetched with a conditional GET and eligible
+# for re-classification; the rest only get a HEAD request
+CRAWL_MAX_REENRICH = int(os.getenv("CRAWL_MAX_REENRICH", "50"))
+
+# Pages are truncated to this many bytes before parsing
+CRAWL_MAX_PAGE_BYTES = int(os.getenv("CRAWL_MAX_PAGE_BYTES", str(2 * 1024 * 1024)))
+
+USER_AGENT = "AI-Bookmark-Manager-LinkChecker/1.0"
+MAX_RETRY_AFTER = 3600.0
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+
+class CrawlJob(NamedTuple):
+    bookmark_id: int
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetch_body: bool
+
+
+class CrawlResult(NamedTuple):
+    status: int  # 0 if the host could not be reached
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content: Optional[bytes] = None
+
+
+class DomainThrottle:
+    """Space out requests to each host by a fixed delay, across worker threads."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, domain: str):
+        """Block until the next request to `domain` is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(domain, 0.0))
+            self._next_slot[domain] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+    def back_off(self, domain: str, seconds: float):
+        """Push back the next allowed request to `domain`, e.g. on Retry-After."""
+        with self._lock:
+            resume = time.monotonic() + min(seconds, MAX_RETRY_AFTER)
+            self._next_slot[domain] = max(self._next_slot.get(domain, 0.0), resume)
+
+
+# Shared across batches so politeness holds between consecutive passes
+_throttle = DomainThrottle(CRAWL_DOMAIN_DELAY)
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        delta = parsedate_to_datetime(value) - datetime.now(timezone.utc)
+        return max(delta.total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_html(response: requests.Response) -> Optional[bytes]:
+    """Read at most CRAWL_MAX_PAGE_BYTES of an HTML body; None for other types."""
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+    if content_type.lower() not in HTML_CONTENT_TYPES:
+        return None
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        body += chunk
+        if len(body) >= CRAWL_MAX_PAGE_BYTES:
+            del body[CRAWL_MAX_PAGE_BYTES:]
+            break
+    return bytes(body)
+
+
+def check_link(
+    session: requests.Session, throttle: DomainThrottle, job: CrawlJob
+) -> CrawlResult:
+    """Check one URL, using a conditional GET or a HEAD request."""
+    domain = urlsplit(job.url).hostname or ""
+    throttle.wait(domain)
+    headers = {}
+    if job.etag:
+        headers["If-None-Match"] = job.etag
+    if job.last_modified:
+        headers["If-Modified-Since"] = job.last_modified
+    try:
+        if job.fetch_body:
+            # Stream so PDFs, videos and other large bodies are never loaded
+            with session.get(
+                job.url, timeout=10, headers=headers, stream=True
+            ) as response:
+                content = _read_html(response) if response.status_code == 200 else None
+        else:
+            content = None
+            response = session.head(
+                job.url, timeout=10, headers=headers, allow_redirects=True
+            )
+            if response.status_code in (405, 501):
+                # HEAD not supported; fall back to GET without reading the body
+                throttle.wait(domain)
+                response = session.get(job.url, timeout=10, stream=True)
+                response.close()
+    except requests.RequestException:
+        return CrawlResult(status=0)
+
+    if response.status_code in (429, 503):
+        delay = _retry_after_seconds(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = CRAWL_DOMAIN_DELAY * 10
+        throttle.back_off(domain, delay)
+    return CrawlResult(
+        status=response.status_code,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        content=content,
+    )
+
+
+def _check_link_safely(session, throttle, job: CrawlJob) -> CrawlResult:
+    """check_link that reports unexpected errors as an unreachable link."""
+    try:
+        return check_link(session, throttle, job)
+    except Exception:
+        logger.exception("Link check failed for %s", job.url)
+        return CrawlResult(status=0)
+
+
+def _interleave_by_domain(jobs: List[CrawlJob]) -> List[CrawlJob]:
+    """Round-robin jobs across hosts so workers don't queue on one domain."""
+    by_domain = OrderedDict()
+    for job in jobs:
+        by_domain.setdefault(urlsplit(job.url).hostname or "", []).append(job)
+    queues = [iter(q) for q in by_domain.values()]
+    ordered = []
+    while queues:
+        remaining = []
+        for queue in queues:
+            job = next(queue, None)
+            if job is not None:
+                ordered.append(job)
+                remaining.append(queue)
+        queues = remaining
+    return ordered
+
+
+def _apply_result(db, db_bookmark, job: CrawlJob, result: CrawlResult):
+    """Record a check result, re-classifying only when the page text changed."""
+    if result.content is None:
+        crud.record_link_check(
+            db,
+            db_bookmark,
+            status=result.status,
+            etag=result.etag if job.fetch_body else None,
+            last_modified=result.last_modified if job.fetch_body else None,
+        )
+        return
+
+    soup, text = ai_utils.parse_html(result.content)
+    content_hash = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+    title = category = None
+    # A missing hash is the first crawl: record a baseline without re-classifying.
+    # Only machine-filled or empty fields are refreshed, so skip inference
+    # entirely when the user chose the category.
+    if db_bookmark.content_hash and content_hash != db_bookmark.content_hash:
+        if db_bookmark.auto_title:
+            title = ai_utils.title_from_soup(soup)
+        if db_bookmark.auto_category or db_bookmark.category is None:
+            _, category = ai_utils.suggest_tags_from_text(text)
+    crud.record_link_check(
+        db,
+        db_bookmark,
+        status=result.status,
+        etag=result.etag,
+        last_modified=result.last_modified,
+        content_hash=content_hash,
+        fingerprint=dedupe.simhash(text),
+        title=title,
+        category=category,
+    )
+
+
+def crawl_once(batch_size: int = CRAWL_BATCH_SIZE) -> int:
+    """Check one batch of due bookmarks. Returns the number checked."""
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+        bookmarks = crud.get_bookmarks_due_for_check(
+            db,
+            checked_before=now - timedelta(hours=CRAWL_RECHECK_HOURS),
+            active_since=now - timedelta(days=CRAWL_ACTIVITY_DAYS),
+            limit=batch_size,
+        )
+        if not bookmarks:
+            return 0
+        by_id = {b.id: b for b in bookmarks}
+        jobs = _interleave_by_domain(
+            [
+                CrawlJob(b.id, b.url, b.etag, b.last_modified, i < CRAWL_MAX_REENRICH)
+                for i, b in enumerate(bookmarks)
+            ]
+        )
+        with timed("crawl.batch"), requests.Session() as session:
+            session.headers["User-Agent"] = USER_AGENT
+            with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as pool:
+                results = pool.map(
+                    lambda j: _check_link_safely(session, _throttle, j), jobs
+                )
+                # Workers share only the HTTP session; results are applied on
+                # this thread, which owns the DB session and runs the model.
+                for job, result in zip(jobs, results):
+                    db_bookmark = by_id[job.bookmark_id]
+                    try:
+                        _apply_result(db, db_bookmark, job, result)
+                    except Exception:
+                        # Record the status alone so the bookmark is not
+                        # retried at the head of every pass
+                        logger.exception("Could not apply result for %s", job.url)
+                        db.rollback()
+                        try:
+                            crud.record_link_check(db, db_bookmark, result.status)
+                        except Exception:
+                            logger.exception("Could not record check for %s", job.url)
+                            db.rollback()
+        return len(jobs)
+    finally:
+        db.close()
+
+
+async def run_forever():
+    """Background task: crawl due bookmarks in batches, sleeping once caught up."""
+    while True:
+        try:
+            checked = await asyncio.to_thread(crawl_once)
+            logger.info("Link crawler checked %d bookmarks", checked)
+        except Exception:
+            logger.exception("Link crawler pass failed")
+            checked = 0
+        if checked < CRAWL_BATCH_SIZE:
+            await asyncio.sleep(CRAWL_INTERVAL_SECONDS)
@@ -1,17 +1,23 @@
-from sqlalchemy.orm import Session
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Optional
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
-from . import models, schemas
+from . import models, schemas, dedupe
+from .metrics import timed_stage
 
 
+@timed_stage("crud.get_bookmark")
 def get_bookmark(db: Session, bookmark_id: int):
     """Retrieve a bookmark by ID."""
     return db.query(models.Bookmark).filter(models.Bookmark.id == bookmark_id).first()
 
 
+@timed_stage("crud.get_bookmarks")
 def get_bookmarks(db: Session, skip: int = 0, limit: int = 100, category: str = None):
     """Retrieve a list of bookmarks, optionally filtered by category, ordered by position."""
-    query = db.query(models.Bookmark)
+    query = db.query(models.Bookmark).options(selectinload(models.Bookmark.tags))
     if category:
         query = query.filter(models.Bookmark.category == category)
     return (
@@ -24,6 +30,7 @@ def get_bookmarks(db: Session, skip: int = 0, limit: int = 100, category: str =
     )
 
 
+@timed_stage("crud.get_tag_by_name")
 def get_tag_by_name(db: Session, tag_name: str):
     """Retrieve or create a tag by name."""
     tag_name = tag_name.lower().strip()
@@ -36,8 +43,52 @@ def get_tag_by_name(db: Session, tag_name: str):
     return tag
 
 
-def create_bookmark(db: Session, bookmark: schemas.BookmarkCreate):
-    """Create a new bookmark with tags and category."""
+@timed_stage("crud.get_bookmark_by_canonical_url")
+def get_bookmark_by_canonical_url(db: Session, canonical_url: str):
+    """Retrieve a bookmark whose URL normalizes to `canonical_url`."""
+    return (
+        db.query(models.Bookmark)
+        .filter(models.Bookmark.canonical_url == canonical_url)
+        .first()
+    )
+
+
+def _set_simhash(db_bookmark: models.Bookmark, fingerprint: int):
+    """Store a content fingerprint and its LSH buckets on a bookmark."""
+    db_bookmark.simhash = fingerprint
+    db_bookmark.simhash_bands = [
+        models.BookmarkSimhashBand(band=band, value=value)
+        for band, value in enumerate(dedupe.lsh_bands(fingerprint))
+    ]
+
+
+def _reset_page_state(db_bookmark: models.Bookmark):
+    """Forget what was learned about the previous page when the URL changes."""
+    db_bookmark.simhash = None
+    db_bookmark.simhash_bands = []
+    db_bookmark.content_hash = None
+    db_bookmark.etag = None
+    db_bookmark.last_modified = None
+    db_bookmark.link_status = None
+    # Due for the crawler's next pass
+    db_bookmark.link_checked_at = None
+
+
+@timed_stage("crud.create_bookmark")
+def create_bookmark(
+    db: Session,
+    bookmark: schemas.BookmarkCreate,
+    fingerprint: Optional[int] = None,
+    auto_title: bool = False,
+    auto_category: bool = False,
+):
+    """Create a new bookmark with tags and category.
+
+    Returns None if a bookmark with the same canonical URL already exists.
+    """
+    canonical_url = dedupe.canonicalize_url(str(bookmark.url))
+    if get_bookmark_by_canonical_url(db, canonical_url):
+        return None
     try:
         # Set position as max(position) + 1 within category
         max_position = (
@@ -48,13 +99,18 @@ def create_bookmark(db: Session, bookmark: schemas.BookmarkCreate):
         )
         db_bookmark = models.Bookmark(
             url=str(bookmark.url),
+            canonical_url=canonical_url,
             title=bookmark.title or "Untitled Bookmark",
             description=bookmark.description,
             category=bookmark.category,
             position=max_position + 1,
+            auto_title=auto_title,
+            auto_category=auto_category and bookmark.category is not None,
         )
         if bookmark.tags:
             db_bookmark.tags = [get_tag_by_name(db, tag) for tag in bookmark.tags]
+        if fingerprint is not None:
+            _set_simhash(db_bookmark, fingerprint)
         db.add(db_bookmark)
         db.commit()
         db.refresh(db_bookmark)
@@ -64,15 +120,37 @@ def create_bookmark(db: Session, bookmark: schemas.BookmarkCreate):
         return None
 
 
+@timed_stage("crud.update_bookmark")
 def update_bookmark(
     db: Session, bookmark_id: int, bookmark_update: schemas.BookmarkUpdate
 ):
-    """Update a bookmark, including tags, category, and position."""
+    """Update a bookmark, including tags, category, and position.
+
+    Returns None if the new URL's canonical form belongs to another bookmark.
+    """
     db_bookmark = get_bookmark(db, bookmark_id)
     if not db_bookmark:
         return None
     try:
         update_data = bookmark_update.dict(exclude_unset=True)
+        if update_data.get("url"):
+            update_data["url"] = str(update_data["url"])
+            canonical_url = dedupe.canonicalize_url(update_data["url"])
+            if canonical_url != db_bookmark.canonical_url:
+                existing = get_bookmark_by_canonical_url(db, canonical_url)
+                if existing and existing.id != bookmark_id:
+                    return None
+                _reset_page_state(db_bookmark)
+            update_data["canonical_url"] = canonical_url
+        # Values the user changed are no longer refreshed by the crawler; the
+        # frontend resends unchanged fields, which must not clear the flags
+        if "title" in update_data and update_data["title"] != db_bookmark.title:
+            db_bookmark.auto_title = False
+        if (
+            "category" in update_data
+            and update_data["category"] != db_bookmark.category
+        ):
+            db_bookmark.auto_category = False
         if "tags" in update_data:
             db_bookmark.tags = [
                 get_tag_by_name(db, tag) for tag in update_data.pop("tags") or []
@@ -87,6 +165,7 @@ def update_bookmark(
         return None
 
 
+@timed_stage("crud.delete_bookmark")
 def delete_bookmark(db: Session, bookmark_id: int):
     """Delete a bookmark by ID."""
     db_bookmark = get_bookmark(db, bookmark_id)
@@ -97,6 +176,7 @@ def delete_bookmark(db: Session, bookmark_id: int):
     return False
 
 
+@timed_stage("crud.reorder_bookmark")
 def reorder_bookmark(db: Session, reorder: schemas.BookmarkReorder):
     """Update bookmark position and category."""
     db_bookmark = get_bookmark(db, reorder.bookmark_id)
@@ -104,8 +184,11 @@ def reorder_bookmark(db: Session, reorder: schemas.BookmarkReorder):
         return None
     try:
         db_bookmark.position = reorder.new_position
-        if reorder.category:
+        # Drag-and-drop always resends the current category; only a move to
+        # another category counts as the user choosing it
+        if reorder.category and reorder.category != db_bookmark.category:
             db_bookmark.category = reorder.category
+            db_bookmark.auto_category = False
         db.commit()
         db.refresh(db_bookmark)
         return db_bookmark
@@ -114,6 +197,7 @@ def reorder_bookmark(db: Session, reorder: schemas.BookmarkReorder):
         return None
 
 
+@timed_stage("crud.search_bookmarks")
 def search_bookmarks(db: Session, query: str, limit: int = 100):
     """Search bookmarks using PostgreSQL full-text search."""
     if not query:
@@ -123,6 +207,7 @@ def search_bookmarks(db: Session, query: str, limit: int = 100):
     )
     return (
         db.query(models.Bookmark)
+        .options(selectinload(models.Bookmark.tags))
         .filter(
             (models.Bookmark.search_vector.op("@@")(func.to_tsquery("english", query)))
             | (
@@ -147,6 +232,7 @@ def search_bookmarks(db: Session, query: str, limit: int = 100):
     )
 
 
+@timed_stage("crud.get_categories")
 def get_categories(db: Session):
     """Retrieve distinct categories."""
     return [
@@ -158,6 +244,7 @@ def get_categories(db: Session):
     ]
 
 
+@timed_stage("crud.log_interaction")
 def log_interaction(db: Session, bookmark_id: int, action: str):
     """Log a user interaction with a bookmark."""
     interaction = models.BookmarkInteraction(bookmark_id=bookmark_id, action=action)
@@ -165,6 +252,341 @@ def log_interaction(db: Session, bookmark_id: int, action: str):
     db.commit()
 
 
+@timed_stage("crud.log_interactions")
+def log_interactions(db: Session, bookmark_ids: Iterable[int], action: str):
+    """Log the same interaction for many bookmarks in a single commit."""
+    rows = [{"bookmark_id": b_id, "action": action} for b_id in bookmark_ids]
+    if rows:
+        db.execute(models.BookmarkInteraction.__table__.insert(), rows)
+        db.commit()
+
+
+@timed_stage("crud.get_bookmarks_due_for_check")
+def get_bookmarks_due_for_check(
+    db: Session, checked_before: datetime, active_since: datetime, limit: int = 500
+):
+    """Retrieve bookmarks due for a link check, most-interacted-with first."""
+    hits = (
+        db.query(
+            models.BookmarkDailyStat.bookmark_id,
+            func.sum(models.BookmarkDailyStat.count).label("hits"),
+        )
+        .filter(models.BookmarkDailyStat.day >= active_since.date())
+        .group_by(models.BookmarkDailyStat.bookmark_id)
+        .subquery()
+    )
+    return (
+        db.query(models.Bookmark)
+        .outerjoin(hits, hits.c.bookmark_id == models.Bookmark.id)
+        .filter(
+            (models.Bookmark.link_checked_at == None)
+            | (models.Bookmark.link_checked_at < checked_before)
+        )
+        .order_by(
+            func.coalesce(hits.c.hits, 0).desc(),
+            models.Bookmark.link_checked_at.asc().nullsfirst(),
+        )
+        .limit(limit)
+        .all()
+    )
+
+
+@timed_stage("crud.record_link_check")
+def record_link_check(
+    db: Session,
+    db_bookmark: models.Bookmark,
+    status: int,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    fingerprint: Optional[int] = None,
+    title: Optional[str] = None,
+    category: Optional[str] = None,
+):
+    """Store the result of a link-health check and any re-enrichment.
+
+    Only machine-filled or empty titles and categories are replaced; tags are
+    never touched.
+    """
+    if status == 304:
+        # Our conditional request found the page unchanged, so the link still
+        # works; keep the last 2xx status rather than exposing the 304
+        if not (db_bookmark.link_status and 200 <= db_bookmark.link_status < 300):
+            db_bookmark.link_status = 200
+    else:
+        db_bookmark.link_status = status
+    db_bookmark.link_checked_at = datetime.now(timezone.utc)
+    if etag is not None:
+        db_bookmark.etag = etag
+    if last_modified is not None:
+        db_bookmark.last_modified = last_modified
+    content_changed = (
+        content_hash is not None and content_hash != db_bookmark.content_hash
+    )
+    if content_hash is not None:
+        db_bookmark.content_hash = content_hash
+    if fingerprint is not None and fingerprint != db_bookmark.simhash:
+        _set_simhash(db_bookmark, fingerprint)
+    elif fingerprint is None and content_changed and db_bookmark.simhash is not None:
+        # The page shrank below the fingerprint minimum (parked domain, bot
+        # challenge); stop matching it against its former content
+        db_bookmark.simhash = None
+        db_bookmark.simhash_bands = []
+    if title and db_bookmark.auto_title:
+        db_bookmark.title = title
+    if category and (db_bookmark.auto_category or db_bookmark.category is None):
+        db_bookmark.category = category
+        db_bookmark.auto_category = True
+    db.commit()
+    return db_bookmark
+
+
+@timed_stage("crud.find_near_duplicates")
+def find_near_duplicates(
+    db: Session,
+    fingerprint: int,
+    exclude_id: Optional[int] = None,
+    classified_only: bool = False,
+    limit: int = 20,
+):
+    """Find bookmarks with near-identical content via LSH buckets, closest first."""
+    buckets = or_(
+        *(
+            and_(
+                models.BookmarkSimhashBand.band == band,
+                models.BookmarkSimhashBand.value == value,
+            )
+            for band, value in enumerate(dedupe.lsh_bands(fingerprint))
+        )
+    )
+    candidate_ids = select(models.BookmarkSimhashBand.bookmark_id).where(buckets)
+    query = db.query(models.Bookmark).filter(models.Bookmark.id.in_(candidate_ids))
+    if exclude_id is not None:
+        query = query.filter(models.Bookmark.id != exclude_id)
+    if classified_only:
+        query = query.filter(models.Bookmark.category != None)
+    matches = [
+        (dedupe.hamming_distance(fingerprint, candidate.simhash), candidate)
+        for candidate in query.all()
+    ]
+    matches = [
+        (distance, candidate)
+        for distance, candidate in matches
+        if distance <= dedupe.NEAR_DUPLICATE_DISTANCE
+    ]
+    matches.sort(key=lambda match: match[0])
+    return [candidate for _, candidate in matches[:limit]]
+
+
+# Upper bound on LSH bucket rows read by one duplicate report
+DUPLICATE_SCAN_LIMIT = 50000
+
+
+@timed_stage("crud.get_duplicate_groups")
+def get_duplicate_groups(
+    db: Session, limit: int = 100, scan_limit: int = DUPLICATE_SCAN_LIMIT
+):
+    """Report groups of bookmarks sharing a canonical URL or near-identical content."""
+    duplicate_urls = (
+        select(models.Bookmark.canonical_url)
+        .where(models.Bookmark.canonical_url != None)
+        .group_by(models.Bookmark.canonical_url)
+        .having(func.count(models.Bookmark.id) > 1)
+        .limit(limit)
+        .subquery()
+    )
+    by_url = {}
+    for canonical_url, bookmark_id in (
+        db.query(models.Bookmark.canonical_url, models.Bookmark.id)
+        .join(
+            duplicate_urls,
+            models.Bookmark.canonical_url == duplicate_urls.c.canonical_url,
+        )
+        .order_by(models.Bookmark.canonical_url, models.Bookmark.id)
+        .all()
+    ):
+        by_url.setdefault(canonical_url, []).append(bookmark_id)
+    groups = [("canonical_url", ids) for ids in by_url.values()]
+
+    if len(groups) < limit:
+        groups += _near_duplicate_clusters(db, scan_limit)
+    groups = groups[:limit]
+
+    # Load every reported bookmark in one query
+    ids = {bookmark_id for _, members in groups for bookmark_id in members}
+    bookmarks = {
+        bookmark.id: bookmark
+        for bookmark in db.query(models.Bookmark)
+        .options(selectinload(models.Bookmark.tags))
+        .filter(models.Bookmark.id.in_(ids))
+        .all()
+    }
+    return [
+        {"reason": reason, "bookmarks": [bookmarks[i] for i in members]}
+        for reason, members in groups
+    ]
+
+
+def _near_duplicate_clusters(db: Session, scan_limit: int):
+    """Cluster near-duplicates from at most `scan_limit` shared-bucket rows."""
+    band = models.BookmarkSimhashBand
+    # Only buckets holding more than one bookmark can contain near-duplicates
+    shared = (
+        select(band.band, band.value)
+        .group_by(band.band, band.value)
+        .having(func.count(band.bookmark_id) > 1)
+        .subquery()
+    )
+    rows = (
+        db.query(band.band, band.value, band.bookmark_id, models.Bookmark.simhash)
+        .join(shared, and_(band.band == shared.c.band, band.value == shared.c.value))
+        .join(models.Bookmark, models.Bookmark.id == band.bookmark_id)
+        .order_by(band.band, band.value, band.bookmark_id)
+        .limit(scan_limit)
+        .all()
+    )
+    buckets, fingerprints = {}, {}
+    for band_no, value, bookmark_id, fingerprint in rows:
+        buckets.setdefault((band_no, value), []).append(bookmark_id)
+        fingerprints[bookmark_id] = fingerprint
+
+    # Union-find over pairs verified by Hamming distance
+    parent = {}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for members in buckets.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1 :]:
+                distance = dedupe.hamming_distance(
+                    fingerprints[first], fingerprints[second]
+                )
+                if distance <= dedupe.NEAR_DUPLICATE_DISTANCE:
+                    parent.setdefault(first, first)
+                    parent.setdefault(second, second)
+                    parent[find(second)] = find(first)
+
+    clusters = {}
+    for bookmark_id in parent:
+        clusters.setdefault(find(bookmark_id), []).append(bookmark_id)
+    return [("near_duplicate", sorted(ids)) for ids in clusters.values()]
+
+
+@timed_stage("crud.backfill_canonical_urls")
+def backfill_canonical_urls(db: Session, batch_size: int = 1000) -> int:
+    """Fill in canonical_url for bookmarks created before it existed."""
+    bookmarks = (
+        db.query(models.Bookmark)
+        .filter(models.Bookmark.canonical_url == None)
+        .limit(batch_size)
+        .all()
+    )
+    for db_bookmark in bookmarks:
+        db_bookmark.canonical_url = dedupe.canonicalize_url(db_bookmark.url)
+    db.commit()
+    return len(bookmarks)
+
+
+def _day_bounds(day: date):
+    """Return the UTC [start, end) datetimes covering a calendar day."""
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+@timed_stage("crud.get_compaction_start_day")
+def get_compaction_start_day(db: Session) -> Optional[date]:
+    """Return the first day compaction still has to (re)process.
+
+    This is the latest day already in daily stats, or the day of the oldest
+    raw event when nothing has been compacted yet.
+    """
+    last_day = db.query(func.max(models.BookmarkDailyStat.day)).scalar()
+    if last_day is not None:
+        return last_day
+    first_event = db.query(func.min(models.BookmarkInteraction.timestamp)).scalar()
+    return first_event.date() if first_event else None
+
+
+@timed_stage("crud.compact_interactions_for_day")
+def compact_interactions_for_day(db: Session, day: date) -> int:
+    """Roll one day of raw interactions into daily counters. Returns rows written.
+
+    Counts are overwritten rather than added, so re-compacting a day whose raw
+    events are still retained is idempotent.
+    """
+    start, end = _day_bounds(day)
+    counts = (
+        db.query(
+            models.BookmarkInteraction.bookmark_id,
+            models.BookmarkInteraction.action,
+            func.count(models.BookmarkInteraction.id),
+        )
+        .filter(
+            models.BookmarkInteraction.timestamp >= start,
+            models.BookmarkInteraction.timestamp < end,
+        )
+        .group_by(
+            models.BookmarkInteraction.bookmark_id, models.BookmarkInteraction.action
+        )
+        .all()
+    )
+    rows = [
+        {"bookmark_id": bookmark_id, "day": day, "action": action, "count": count}
+        for bookmark_id, action, count in counts
+    ]
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(models.BookmarkDailyStat).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bookmark_id", "day", "action"],
+            set_={"count": stmt.excluded["count"]},
+        )
+        db.execute(stmt)
+    else:
+        for row in rows:
+            db.merge(models.BookmarkDailyStat(**row))
+    db.commit()
+    return len(rows)
+
+
+@timed_stage("crud.purge_interactions")
+def purge_interactions(db: Session, before: datetime, batch_size: int = 5000) -> int:
+    """Delete raw interactions older than `before` in small batches.
+
+    Each batch is its own short transaction so the delete never holds locks
+    for long. Returns the number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        batch = (
+            select(models.BookmarkInteraction.id)
+            .where(models.BookmarkInteraction.timestamp < before)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = db.execute(
+            delete(models.BookmarkInteraction)
+            .where(models.BookmarkInteraction.timestamp < before)
+            .where(models.BookmarkInteraction.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+@timed_stage("crud.get_analytics")
 def get_analytics(db: Session):
     """Retrieve analytics data."""
     # Category counts
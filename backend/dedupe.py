@@ -0,0 +1,112 @@
+import re
+import hashlib
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_hsenc",
+    "_hsmi",
+    "ref_src",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_")
+
+SIMHASH_BITS = 64
+# 4 bands of 16 bits: any two fingerprints within Hamming distance 3 share a band
+LSH_BANDS = 4
+LSH_BAND_BITS = SIMHASH_BITS // LSH_BANDS
+NEAR_DUPLICATE_DISTANCE = 3
+SHINGLE_SIZE = 3
+# Shorter pages (bot challenges, "enable JavaScript" shells) are mostly
+# boilerplate shared across unrelated sites, so they are not fingerprinted
+MIN_SIMHASH_SHINGLES = 50
+
+_MASK64 = (1 << SIMHASH_BITS) - 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so trivially different forms of one page compare equal.
+
+    Forces https, lowercases the host, drops "www.", default ports, in-page
+    anchors, tracking parameters and trailing slashes, and sorts the query
+    string. Fragments that look like client-side routes ("#/..." or "#!...")
+    are kept, since they select different pages.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    if parts.port and parts.port not in (80, 443):
+        netloc = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in TRACKING_PARAMS
+            and not key.lower().startswith(TRACKING_PREFIXES)
+        )
+    )
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) else ""
+    return urlunsplit(("https", netloc, path, query, fragment))
+
+
+def _shingles(text: str) -> List[str]:
+    """Overlapping lowercase word n-grams of the text."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return [" ".join(words)] if words else []
+    return [
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    ]
+
+
+def simhash(text: Optional[str]) -> Optional[int]:
+    """64-bit SimHash of word shingles, as a signed int for a BIGINT column.
+
+    Returns None when the text is too short to fingerprint reliably.
+    """
+    shingles = _shingles(text or "")
+    if len(shingles) < MIN_SIMHASH_SHINGLES:
+        return None
+    rows = [
+        format(
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+            ),
+            "064b",
+        )
+        for shingle in shingles
+    ]
+    # Majority vote per bit position; zip(*rows) keeps the counting in C
+    half = len(rows) / 2
+    bits = "".join("1" if column.count("1") > half else "0" for column in zip(*rows))
+    fingerprint = int(bits, 2)
+    # Store as two's complement so it fits a signed 64-bit column
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >> 63 else fingerprint
+
+
+def lsh_bands(fingerprint: int) -> List[int]:
+    """Split a fingerprint into LSH band values, lowest bits first."""
+    unsigned = fingerprint & _MASK64
+    band_mask = (1 << LSH_BAND_BITS) - 1
+    return [
+        (unsigned >> (band * LSH_BAND_BITS)) & band_mask for band in range(LSH_BANDS)
+    ]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return bin((a ^ b) & _MASK64).count("1")
@@ -2,13 +2,36 @@ from fastapi import FastAPI, Depends, HTTPException, WebSocket
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from typing import List
-from . import crud, schemas, ai_utils, ws_manager
+import asyncio
+import os
+from . import crud, schemas, ai_utils, ws_manager, metrics, crawler, maintenance
+from . import dedupe, schema_upgrade
+from .serialization import (
+    FAST_LIST_SERIALIZATION,
+    ORJSONResponse,
+    bookmark_to_dict,
+    bookmarks_to_list,
+)
 from .database import SessionLocal, engine, get_db
 
 # Initialize database
 models.Base.metadata.create_all(bind=engine)
+# create_all never alters existing tables; add columns and indexes added since
+schema_upgrade.upgrade_schema(engine)
+# Fill canonical_url for bookmarks created before it existed, so the dedupe
+# check and duplicate report see them whatever background jobs are enabled
+with SessionLocal() as db:
+    while crud.backfill_canonical_urls(db):
+        pass
+# Inserts into a partitioned bookmark_interactions fail until partitions exist,
+# so create them now rather than waiting for the maintenance task
+maintenance.ensure_partitions()
 
-app = FastAPI(title="AI Bookmark Manager")
+app = FastAPI(title="AI Bookmark Manager", default_response_class=ORJSONResponse)
+
+# Request latency, per-request DB query counts and slow-request profiling
+metrics.instrument_engine(engine)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Serve React frontend
 app.mount("/static", StaticFiles(directory="../frontend/dist"), name="static")
@@ -17,6 +40,15 @@ app.mount("/static", StaticFiles(directory="../frontend/dist"), name="static")
 ws_manager = ws_manager.ConnectionManager()
 
 
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start interaction maintenance, and the link-health crawler when enabled."""
+    if os.getenv("INTERACTION_MAINTENANCE_ENABLED", "1") == "1":
+        app.state.maintenance_task = asyncio.create_task(maintenance.run_forever())
+    if os.getenv("CRAWLER_ENABLED") == "1":
+        app.state.crawler_task = asyncio.create_task(crawler.run_forever())
+
+
 # --- WebSocket Route ---
 @app.websocket("/ws/bookmarks")
 async def websocket_endpoint(websocket: WebSocket):
@@ -29,19 +61,46 @@ async def websocket_endpoint(websocket: WebSocket):
         ws_manager.disconnect(websocket)
 
 
+# --- Metrics Route ---
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Expose Prometheus metrics."""
+    return metrics.metrics_response()
+
+
 # --- API Routes ---
 @app.post("/bookmarks/", response_model=schemas.BookmarkResponse)
 async def create_bookmark(
     bookmark: schemas.BookmarkCreate, db: Session = Depends(get_db)
 ):
     """Create a new bookmark and broadcast update."""
-    if not bookmark.title:
-        bookmark.title = (
-            ai_utils.extract_title_from_url(str(bookmark.url)) or "Untitled Bookmark"
+    # Reject known URLs before paying for a fetch and inference
+    canonical_url = dedupe.canonicalize_url(str(bookmark.url))
+    if crud.get_bookmark_by_canonical_url(db, canonical_url):
+        raise HTTPException(
+            status_code=400, detail="Bookmark with this URL already exists"
         )
+    fingerprint = None
+    auto_title, auto_category = not bookmark.title, not bookmark.category
+    if not bookmark.title or not bookmark.category:
+        soup, text = ai_utils.fetch_page_content(str(bookmark.url))
+        fingerprint = dedupe.simhash(text)
+        if not bookmark.title:
+            bookmark.title = ai_utils.title_from_soup(soup) or "Untitled Bookmark"
     if not bookmark.category:
-        _, bookmark.category = ai_utils.suggest_tags_from_url(str(bookmark.url))
-    created_bookmark = crud.create_bookmark(db, bookmark)
+        # Reuse the category of an already-classified copy of this page
+        duplicates = (
+            crud.find_near_duplicates(db, fingerprint, classified_only=True, limit=1)
+            if fingerprint is not None
+            else []
+        )
+        if duplicates:
+            bookmark.category = duplicates[0].category
+        else:
+            _, bookmark.category = ai_utils.suggest_tags_from_text(text)
+    created_bookmark = crud.create_bookmark(
+        db, bookmark, fingerprint, auto_title=auto_title, auto_category=auto_category
+    )
     if not created_bookmark:
         raise HTTPException(
             status_code=400, detail="Bookmark with this URL already exists"
@@ -50,7 +109,7 @@ async def create_bookmark(
     await ws_manager.broadcast(
         {
             "action": "create",
-            "bookmark": schemas.BookmarkResponse.from_orm(created_bookmark).dict(),
+            "bookmark": bookmark_to_dict(created_bookmark),
         }
     )
     return created_bookmark
@@ -62,11 +121,34 @@ async def read_bookmarks(
 ):
     """Retrieve a list of bookmarks, optionally filtered by category."""
     bookmarks = crud.get_bookmarks(db, skip=skip, limit=limit, category=category)
-    for bookmark in bookmarks:
-        crud.log_interaction(db, bookmark.id, "view")
+    # Serialize before logging: the interaction commit expires the loaded rows
+    payload = bookmarks_to_list(bookmarks) if FAST_LIST_SERIALIZATION else None
+    crud.log_interactions(db, [bookmark.id for bookmark in bookmarks], "view")
+    if payload is not None:
+        return ORJSONResponse(payload)
     return bookmarks
 
 
+@app.get("/bookmarks/duplicates/", response_model=List[schemas.DuplicateGroup])
+async def read_duplicate_groups(limit: int = 100, db: Session = Depends(get_db)):
+    """Report bookmarks sharing a canonical URL or near-identical content."""
+    return crud.get_duplicate_groups(db, limit=limit)
+
+
+@app.get(
+    "/bookmarks/{bookmark_id}/duplicates",
+    response_model=List[schemas.BookmarkResponse],
+)
+async def read_bookmark_duplicates(bookmark_id: int, db: Session = Depends(get_db)):
+    """Retrieve near-duplicates of a bookmark's content, closest first."""
+    bookmark = crud.get_bookmark(db, bookmark_id)
+    if not bookmark:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    if bookmark.simhash is None:
+        return []
+    return crud.find_near_duplicates(db, bookmark.simhash, exclude_id=bookmark_id)
+
+
 @app.get("/bookmarks/{bookmark_id}", response_model=schemas.BookmarkResponse)
 async def read_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
     """Retrieve a single bookmark by ID."""
@@ -82,6 +164,14 @@ async def update_bookmark(
     bookmark_id: int, bookmark: schemas.BookmarkUpdate, db: Session = Depends(get_db)
 ):
     """Update a bookmark and broadcast update."""
+    if bookmark.url:
+        existing = crud.get_bookmark_by_canonical_url(
+            db, dedupe.canonicalize_url(str(bookmark.url))
+        )
+        if existing and existing.id != bookmark_id:
+            raise HTTPException(
+                status_code=400, detail="Bookmark with this URL already exists"
+            )
     updated_bookmark = crud.update_bookmark(db, bookmark_id, bookmark)
     if not updated_bookmark:
         raise HTTPException(
@@ -91,7 +181,7 @@ async def update_bookmark(
     await ws_manager.broadcast(
         {
             "action": "update",
-            "bookmark": schemas.BookmarkResponse.from_orm(updated_bookmark).dict(),
+            "bookmark": bookmark_to_dict(updated_bookmark),
         }
     )
     return updated_bookmark
@@ -109,7 +199,7 @@ async def reorder_bookmark(
     await ws_manager.broadcast(
         {
             "action": "update",
-            "bookmark": schemas.BookmarkResponse.from_orm(updated_bookmark).dict(),
+            "bookmark": bookmark_to_dict(updated_bookmark),
         }
     )
     return updated_bookmark
@@ -129,8 +219,11 @@ async def delete_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
 async def search_bookmarks(query: str, limit: int = 100, db: Session = Depends(get_db)):
     """Search bookmarks using full-text search."""
     bookmarks = crud.search_bookmarks(db, query, limit)
-    for bookmark in bookmarks:
-        crud.log_interaction(db, bookmark.id, "view")
+    # Serialize before logging: the interaction commit expires the loaded rows
+    payload = bookmarks_to_list(bookmarks) if FAST_LIST_SERIALIZATION else None
+    crud.log_interactions(db, [bookmark.id for bookmark in bookmarks], "view")
+    if payload is not None:
+        return ORJSONResponse(payload)
     return bookmarks
 
 
@@ -0,0 +1,187 @@
+import os
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from . import crud
+from .database import SessionLocal, engine
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Seconds between maintenance passes
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+# Raw interaction events older than this are dropped once compacted
+INTERACTION_RETENTION_DAYS = int(os.getenv("INTERACTION_RETENTION_DAYS", "90"))
+# Monthly partitions created ahead of the current month (Postgres only)
+PARTITIONS_AHEAD = int(os.getenv("INTERACTION_PARTITIONS_AHEAD", "2"))
+# Maintenance gives up on a DDL statement rather than queue behind other locks
+LOCK_TIMEOUT = os.getenv("MAINTENANCE_LOCK_TIMEOUT", "5s")
+
+PARENT_TABLE = "public.bookmark_interactions"
+PARTITION_PREFIX = "bookmark_interactions_p"
+
+
+def _month_start(day: date) -> date:
+    """First day of the month containing `day`."""
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    """First day of the month after the one containing `day`."""
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _is_partitioned(conn) -> bool:
+    """Whether bookmark_interactions is a Postgres partitioned table."""
+    if conn.dialect.name != "postgresql":
+        return False
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass(:table)"
+            ),
+            {"table": PARENT_TABLE},
+        ).first()
+        is not None
+    )
+
+
+@contextmanager
+def _ddl_connection():
+    """AUTOCOMMIT connection with LOCK_TIMEOUT applied for the duration.
+
+    SET is session-scoped and the pool does not undo it, so the timeout is
+    reset before the connection goes back to the pool.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name != "postgresql":
+            yield conn
+            return
+        conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        try:
+            yield conn
+        finally:
+            conn.execute(text("RESET lock_timeout"))
+
+
+def ensure_partitions(today: Optional[date] = None):
+    """Create the default partition and monthly partitions up to PARTITIONS_AHEAD."""
+    today = today or datetime.now(timezone.utc).date()
+    with _ddl_connection() as conn:
+        if not _is_partitioned(conn):
+            return
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS public.{PARTITION_PREFIX}default "
+                f"PARTITION OF {PARENT_TABLE} DEFAULT"
+            )
+        )
+        month = _month_start(today)
+        for _ in range(PARTITIONS_AHEAD + 1):
+            upper = _next_month(month)
+            try:
+                conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS "
+                        f"public.{PARTITION_PREFIX}{month:%Y%m} "
+                        f"PARTITION OF {PARENT_TABLE} "
+                        # Explicit UTC offset: bare dates would be read in the
+                        # server's TimeZone, while compaction uses UTC days
+                        f"FOR VALUES FROM ('{month} 00:00+00') "
+                        f"TO ('{upper} 00:00+00')"
+                    )
+                )
+            except Exception:
+                # Fails if the default partition already holds rows in range
+                logger.exception("Could not create partition for %s", month)
+            month = upper
+
+
+def drop_expired_partitions(before: date) -> int:
+    """Detach and drop monthly partitions that end on or before `before`."""
+    dropped = 0
+    with _ddl_connection() as conn:
+        if not _is_partitioned(conn):
+            return 0
+        names = conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table)"
+            ),
+            {"table": PARENT_TABLE},
+        ).scalars()
+        for name in sorted(names):
+            suffix = name[len(PARTITION_PREFIX) :]
+            if not name.startswith(PARTITION_PREFIX) or not suffix.isdigit():
+                continue
+            month = datetime.strptime(suffix, "%Y%m").date()
+            if _next_month(month) > before:
+                continue
+            # DETACH ... CONCURRENTLY is not allowed alongside a DEFAULT
+            # partition; lock_timeout keeps the plain DETACH from waiting long
+            try:
+                conn.execute(
+                    text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION public.{name}")
+                )
+                conn.execute(text(f"DROP TABLE public.{name}"))
+            except Exception:
+                logger.exception("Could not drop partition %s", name)
+                continue
+            dropped += 1
+    return dropped
+
+
+def run_maintenance(today: Optional[date] = None) -> dict:
+    """Run one pass: partitions, compaction and retention."""
+    today = today or datetime.now(timezone.utc).date()
+    with timed("maintenance.partitions"):
+        ensure_partitions(today)
+
+    db = SessionLocal()
+    try:
+        with timed("maintenance.compact"):
+            compacted_days = 0
+            day = crud.get_compaction_start_day(db)
+            # Only finished days are compacted; today is still receiving events
+            while day is not None and day < today:
+                crud.compact_interactions_for_day(db, day)
+                compacted_days += 1
+                day += timedelta(days=1)
+
+        # Never drop raw events that have not been rolled up yet
+        retention_day = today - timedelta(days=INTERACTION_RETENTION_DAYS)
+        compacted_through = crud.get_compaction_start_day(db)
+        if compacted_through is None:
+            return {"compacted_days": compacted_days}
+        cutoff_day = min(retention_day, compacted_through)
+
+        with timed("maintenance.retention"):
+            dropped = drop_expired_partitions(cutoff_day)
+            # Rows in the default partition, or in an unpartitioned table
+            purged = crud.purge_interactions(
+                db, datetime.combine(cutoff_day, time.min, tzinfo=timezone.utc)
+            )
+        return {
+            "compacted_days": compacted_days,
+            "dropped_partitions": dropped,
+            "purged_rows": purged,
+        }
+    finally:
+        db.close()
+
+
+async def run_forever():
+    """Background task: run interaction maintenance periodically."""
+    while True:
+        try:
+            result = await asyncio.to_thread(run_maintenance)
+            logger.info("Interaction maintenance: %s", result)
+        except Exception:
+            logger.exception("Interaction maintenance pass failed")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
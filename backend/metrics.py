@@ -0,0 +1,177 @@
+import os
+import time
+import random
+import functools
+import logging
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+try:
+    from opentelemetry import trace
+
+    # A no-op tracer unless an OpenTelemetry SDK is configured
+    _tracer = trace.get_tracer(__name__)
+except ImportError:
+    _tracer = None
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this (seconds) are logged; a fraction of them is profiled
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+# Fraction of requests to run under the sampling profiler (0 disables it)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Route label for requests no route matched, so 404s can't add label sets
+UNMATCHED_ROUTE = "<unmatched>"
+
+# --- Metric definitions ---
+STAGE_LATENCY = Histogram(
+    "bookmark_stage_seconds",
+    "Latency of hot-path stages (fetch, parse, tokenize, infer, crud.*).",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Number of database queries issued per HTTP request.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+WS_CONNECTIONS = Gauge(
+    "websocket_connections", "Currently open WebSocket connections."
+)
+WS_CONNECTS = Counter("websocket_connects_total", "WebSocket connections accepted.")
+WS_BROADCASTS = Counter("websocket_broadcasts_total", "Broadcasts sent.")
+WS_SEND_FAILURES = Counter(
+    "websocket_send_failures_total", "Broadcast sends that failed and dropped a client."
+)
+MODEL_MEMORY = Gauge(
+    "model_memory_bytes", "Memory held by model parameters and buffers.", ["model"]
+)
+
+# Per-request query counter; None outside of a request
+_query_count: ContextVar[Optional[list]] = ContextVar("_query_count", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block under a stage label, in a same-named span if tracing is on."""
+    span = _tracer.start_as_current_span(stage) if _tracer else nullcontext()
+    start = time.perf_counter()
+    try:
+        with span:
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def timed_stage(stage: str):
+    """Decorator form of `timed`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_engine(engine):
+    """Count every statement executed on the engine against the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        counter = _query_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def record_model_memory(name: str, model) -> None:
+    """Publish the parameter and buffer size of a torch model."""
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    size += sum(b.numel() * b.element_size() for b in model.buffers())
+    MODEL_MEMORY.labels(model=name).set(size)
+
+
+def _start_profiler():
+    """Start a pyinstrument sampling profiler if it is installed."""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def _route_label(request: Request) -> str:
+    """Path template of the matched route or mount, never the raw URL path."""
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in request.app.router.routes:
+            match, _ = candidate.matches(request.scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record request latency and DB query counts, and profile slow requests."""
+
+    async def dispatch(self, request: Request, call_next):
+        counter = [0]
+        token = _query_count.set(counter)
+        profiler = None
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            profiler = _start_profiler()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            _query_count.reset(token)
+            path = _route_label(request)
+            REQUEST_LATENCY.labels(request.method, path, str(status)).observe(elapsed)
+            REQUEST_DB_QUERIES.labels(request.method, path).observe(counter[0])
+            if profiler is not None:
+                profiler.stop()
+            if elapsed >= SLOW_REQUEST_SECONDS:
+                logger.warning(
+                    "Slow request %s %s: %.3fs, %d queries",
+                    request.method,
+                    path,
+                    elapsed,
+                    counter[0],
+                )
+                if profiler is not None:
+                    logger.warning(profiler.output_text(unicode=True))
+
+
+def metrics_response() -> Response:
+    """Render all registered metrics in the Prometheus text format."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -8,6 +8,12 @@ from sqlalchemy import (
     Table,
     Computed,
     Float,
+    Date,
+    Index,
+    BigInteger,
+    SmallInteger,
+    Boolean,
+    false,
 )
 from sqlalchemy.sql import func
 from .database import Base
@@ -28,12 +34,25 @@ class Bookmark(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String, index=True, nullable=False, unique=True)
+    canonical_url = Column(String, index=True, nullable=True)  # See dedupe.py
     title = Column(String, index=True, nullable=False)
     description = Column(Text, nullable=True)
     category = Column(String, nullable=True)
     position = Column(Float, nullable=False, default=0.0)  # For drag-and-drop ordering
+    # True while the title/category is machine-filled; the crawler may refresh it
+    auto_title = Column(Boolean, nullable=False, server_default=false())
+    auto_category = Column(Boolean, nullable=False, server_default=false())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Link health, maintained by the background crawler
+    # Last HTTP status (a 304 to our conditional request is kept as 2xx);
+    # 0 if unreachable
+    link_status = Column(Integer, nullable=True)
+    link_checked_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 of extracted text
+    simhash = Column(BigInteger, nullable=True)  # SimHash of extracted text
     search_vector = Column(
         Text,
         Computed(
@@ -42,7 +61,12 @@ class Bookmark(Base):
         ),
     )
     tags = relationship("Tag", secondary=bookmark_tags, back_populates="bookmarks")
-    interactions = relationship("BookmarkInteraction", back_populates="bookmark")
+    interactions = relationship(
+        "BookmarkInteraction", back_populates="bookmark", passive_deletes=True
+    )
+    simhash_bands = relationship(
+        "BookmarkSimhashBand", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class Tag(Base):
@@ -56,10 +80,55 @@ class Tag(Base):
 
 class BookmarkInteraction(Base):
     __tablename__ = "bookmark_interactions"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        Index(
+            "ix_bookmark_interactions_bookmark_id_timestamp",
+            "bookmark_id",
+            "timestamp",
+        ),
+        Index("ix_bookmark_interactions_timestamp", "timestamp"),
+        # Monthly range partitions are managed by backend/maintenance.py
+        {"schema": "public", "postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    bookmark_id = Column(Integer, ForeignKey("bookmarks.id"), nullable=False)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    bookmark_id = Column(
+        Integer, ForeignKey("bookmarks.id", ondelete="CASCADE"), nullable=False
+    )
     action = Column(String, nullable=False)  # e.g., "view", "edit"
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Part of the primary key because Postgres requires it on partitioned tables
+    timestamp = Column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
     bookmark = relationship("Bookmark", back_populates="interactions")
+
+
+# Daily per-bookmark action counts, compacted from bookmark_interactions
+class BookmarkDailyStat(Base):
+    __tablename__ = "bookmark_daily_stats"
+    __table_args__ = (
+        Index("ix_bookmark_daily_stats_day", "day"),
+        {"schema": "public"},
+    )
+
+    bookmark_id = Column(
+        Integer, ForeignKey("bookmarks.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    action = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# LSH buckets of Bookmark.simhash for sub-linear near-duplicate lookup
+class BookmarkSimhashBand(Base):
+    __tablename__ = "bookmark_simhash_bands"
+    __table_args__ = (
+        Index("ix_bookmark_simhash_bands_band_value", "band", "value"),
+        {"schema": "public"},
+    )
+
+    bookmark_id = Column(
+        Integer, ForeignKey("bookmarks.id", ondelete="CASCADE"), primary_key=True
+    )
+    band = Column(SmallInteger, primary_key=True)
+    value = Column(Integer, nullable=False)
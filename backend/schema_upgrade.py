@@ -0,0 +1,107 @@
+import logging
+
+from sqlalchemy import inspect, text
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Tables that gained columns, indexes or constraints after their first release
+UPGRADED_TABLES = (models.Bookmark.__table__, models.BookmarkInteraction.__table__)
+
+
+def _add_missing_columns(conn, table):
+    """ALTER TABLE ... ADD COLUMN for model columns the database lacks."""
+    existing = {
+        column["name"]
+        for column in inspect(conn).get_columns(table.name, schema=table.schema)
+    }
+    preparer = conn.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name in existing or column.computed is not None:
+            continue
+        ddl = (
+            f"ALTER TABLE {preparer.format_table(table)} "
+            f"ADD COLUMN {preparer.format_column(column)} "
+            f"{column.type.compile(dialect=conn.dialect)}"
+        )
+        if column.server_default is not None:
+            default = column.server_default.arg.compile(dialect=conn.dialect)
+            ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            if column.server_default is None:
+                logger.warning("Cannot add NOT NULL column %s", column)
+                continue
+            ddl += " NOT NULL"
+        logger.info("Adding column %s", column)
+        conn.execute(text(ddl))
+
+
+def _create_missing_indexes(engine, table):
+    """Build model indexes the database lacks without blocking writes.
+
+    CREATE INDEX CONCURRENTLY cannot run inside a transaction, so this uses an
+    AUTOCOMMIT connection. Indexes on a new partitioned table already come
+    from create_all, so they are never rebuilt here.
+    """
+    existing = {
+        index["name"]
+        for index in inspect(engine).get_indexes(table.name, schema=table.schema)
+    }
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            logger.info("Creating index %s", index.name)
+            options = index.dialect_options["postgresql"]
+            options["concurrently"] = True
+            try:
+                index.create(conn)
+            finally:
+                options["concurrently"] = False
+
+
+def _cascade_interaction_deletes(engine):
+    """Recreate the interactions -> bookmarks foreign key with ON DELETE CASCADE.
+
+    Bookmark deletes rely on the database to remove interactions. The NOT VALID
+    swap is committed on its own so its ACCESS EXCLUSIVE lock is brief; the
+    VALIDATE scan then runs in a separate transaction under a weaker lock.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    table = models.BookmarkInteraction.__table__
+    for fk in inspect(engine).get_foreign_keys(table.name, schema=table.schema):
+        if fk["referred_table"] != "bookmarks":
+            continue
+        if (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+            continue
+        name = engine.dialect.identifier_preparer.quote(fk["name"])
+        logger.info("Adding ON DELETE CASCADE to %s", fk["name"])
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"ALTER TABLE public.{table.name} DROP CONSTRAINT {name}, "
+                    f"ADD CONSTRAINT {name} FOREIGN KEY (bookmark_id) "
+                    f"REFERENCES public.bookmarks (id) ON DELETE CASCADE NOT VALID"
+                )
+            )
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"ALTER TABLE public.{table.name} VALIDATE CONSTRAINT {name}")
+            )
+
+
+def upgrade_schema(engine):
+    """Bring tables created by an older release up to the current models.
+
+    create_all only creates missing tables, so columns, indexes and the
+    cascading foreign key added since then are applied here. An existing
+    bookmark_interactions table is not converted to a partitioned one;
+    maintenance falls back to batched deletes for it.
+    """
+    with engine.begin() as conn:
+        for table in UPGRADED_TABLES:
+            _add_missing_columns(conn, table)
+    for table in UPGRADED_TABLES:
+        _create_missing_indexes(engine, table)
+    _cascade_interaction_deletes(engine)
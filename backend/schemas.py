@@ -43,12 +43,19 @@ class BookmarkResponse(BookmarkBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    link_status: Optional[int] = None
+    link_checked_at: Optional[datetime] = None
     tags: List[TagResponse] = []
 
     class Config:
         from_attributes = True
 
 
+class DuplicateGroup(BaseModel):
+    reason: str  # "canonical_url" or "near_duplicate"
+    bookmarks: List[BookmarkResponse]
+
+
 class BookmarkReorder(BaseModel):
     bookmark_id: int
     new_position: float
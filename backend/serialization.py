@@ -0,0 +1,46 @@
+import os
+from typing import Any, Iterable, List
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# Serve list/search endpoints from plain dicts instead of validating every row
+# through BookmarkResponse; set FAST_LIST_SERIALIZATION=0 to disable
+FAST_LIST_SERIALIZATION = os.getenv("FAST_LIST_SERIALIZATION", "1") == "1"
+
+# OPT_UTC_Z matches Pydantic's "Z" suffix for UTC datetimes
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content to JSON bytes with orjson."""
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def bookmark_to_dict(bookmark) -> dict:
+    """Convert a Bookmark row to the BookmarkResponse shape without validation."""
+    return {
+        "url": bookmark.url,
+        "title": bookmark.title,
+        "description": bookmark.description,
+        "category": bookmark.category,
+        "position": bookmark.position,
+        "id": bookmark.id,
+        "created_at": bookmark.created_at,
+        "updated_at": bookmark.updated_at,
+        "link_status": bookmark.link_status,
+        "link_checked_at": bookmark.link_checked_at,
+        "tags": [{"name": tag.name, "id": tag.id} for tag in bookmark.tags],
+    }
+
+
+def bookmarks_to_list(bookmarks: Iterable) -> List[dict]:
+    """Convert Bookmark rows to a list of response dicts."""
+    return [bookmark_to_dict(bookmark) for bookmark in bookmarks]
@@ -1,6 +1,12 @@
 from fastapi import WebSocket
 from typing import List
-import json
+from .serialization import dumps
+from .metrics import (
+    WS_CONNECTIONS,
+    WS_CONNECTS,
+    WS_BROADCASTS,
+    WS_SEND_FAILURES,
+)
 
 
 class ConnectionManager:
@@ -13,18 +19,29 @@ class ConnectionManager:
         """Accept a new WebSocket connection."""
         await websocket.accept()
         self.active_connections.append(websocket)
+        WS_CONNECTS.inc()
+        WS_CONNECTIONS.set(len(self.active_connections))
 
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection."""
         self.active_connections.remove(websocket)
+        WS_CONNECTIONS.set(len(self.active_connections))
 
     async def broadcast(self, message: dict):
         """Broadcast a message to all connected clients."""
-        for connection in self.active_connections:
+        await self.broadcast_bytes(dumps(message))
+
+    async def broadcast_bytes(self, payload: bytes):
+        """Broadcast an already-encoded JSON payload as a text frame."""
+        WS_BROADCASTS.inc()
+        text = payload.decode("utf-8")
+        for connection in list(self.active_connections):
             try:
-                await connection.send_json(message)
+                await connection.send_text(text)
             except Exception:
+                WS_SEND_FAILURES.inc()
                 self.active_connections.remove(connection)
+        WS_CONNECTIONS.set(len(self.active_connections))
 
 
 manager = ConnectionManager()